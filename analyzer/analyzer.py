@@ -1,14 +1,104 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import re
 import json
 import plotly.express as px
 import os
 import glob
+import mmap
 from collections import defaultdict
 
+try:
+    # orjson がインストールされていれば、プロンプトJSONのパースに高速な orjson を使う
+    # (orjson.JSONDecodeError は json.JSONDecodeError のサブクラス)
+    from orjson import loads as _json_loads
+except ImportError:
+    _json_loads = json.loads
+
+# ログ解析で探す3種類の行 (ハンド開始 / プロンプト / 意思決定) を1つの正規表現にまとめ、
+# ファイル全体に対して一度の走査で見つける。どれにマッチしたかは lastgroup で判別する
+# (先頭の " - " はログ書式の区切りで、固定文字列から始めることで正規表現の走査が速くなる)
+# ログはmmapしたバイト列のまま走査するため、パターンもバイト列で書く
+_LINE_RE = re.compile(
+    rb" - (?:"
+    rb"(?P<hand>=== STARTING NEW HAND #(?P<hand_id>\d+) ===)"
+    rb"|(?P<prompt>LLM Prompt for (?P<prompt_agent>Agent\d+): \{)"
+    rb"|(?P<decision>\[(?P<decision_agent>Agent\d+)\] Successfully parsed decision: "
+    rb"(?P<action>\w+), (?P<amount>\d+), (?P<reasoning>.*))"
+    rb")"
+)
+# 行頭の '}' で終端を判断できないプロンプトJSONを、終端位置ごと読み取るためのデコーダ
+_JSON_DECODER = json.JSONDecoder()
+
+# コミュニティカードの枚数 (0〜5枚) をインデックスとしたフェーズ名
+_PHASE_BY_NCC = ("preflop", "unknown", "unknown", "flop", "turn", "river")
+# ポーカーの進行順に並べたフェーズ一覧 (phase列のカテゴリ順)
+_PHASE_ORDER = ["preflop", "flop", "turn", "river", "unknown"]
+
+# 解析結果の列構成や型を変えたら上げる (古いキャッシュを読まないようにするため)
+_PARQUET_CACHE_VERSION = 3
+
+def _parquet_cache_path(log_file):
+    """
+    ログファイルの更新時刻とサイズをキーにした、解析結果キャッシュ (Parquet) のパスを返します。
+    """
+    key = f"{os.path.getmtime(log_file):.0f}_{os.path.getsize(log_file)}_v{_PARQUET_CACHE_VERSION}"
+    return f"{log_file}.{key}.parquet"
+
+def _read_parquet_cache(cache_path):
+    """
+    Parquetキャッシュを読み込み、JSON文字列で保存したプロンプトを辞書に戻します。
+    """
+    df = pd.read_parquet(cache_path)
+    df["input_prompt_json"] = df["input_prompt_json"].map(_json_loads)
+    return df
+
+def _write_parquet_cache(df, cache_path):
+    """
+    解析結果をParquetキャッシュとして保存します。
+    保存に失敗しても解析自体は成功しているため、エラーにはしません。
+    """
+    # プロンプト（辞書）は構造がまちまちなので、JSON文字列の列として保存する
+    cache_df = df.assign(
+        input_prompt_json=df["input_prompt_json"].map(lambda d: json.dumps(d, ensure_ascii=False))
+    )
+    tmp_path = f"{cache_path}.tmp"
+    try:
+        cache_df.to_parquet(tmp_path, compression="zstd")
+        # 書き込み途中のファイルを読まないよう、書き終えてから置き換える
+        os.replace(tmp_path, cache_path)
+    except Exception:
+        # 書き込み権限が無い、pyarrowが無いなどの場合はキャッシュせずに続行
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _decode_prompt_json(log_bytes, json_start):
+    """
+    log_bytes[json_start] の '{' から始まるプロンプトJSONをパースし、(パース結果, 終端位置) を返します。
+    パースできない場合は json.JSONDecodeError (または UnicodeDecodeError) を送出します。
+    """
+    # 整形されたJSONは行頭の '}' で終わるので、まずはその範囲をバイト列のままパースする
+    json_end = log_bytes.find(b"\n}", json_start)
+    if json_end >= 0:
+        json_end += 2
+        try:
+            return _json_loads(log_bytes[json_start:json_end]), json_end
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            pass
+
+    # 行頭の '}' で区切れない場合は、次の該当行の手前までを文字列にして raw_decode で終端を探す
+    # (文字列中の '{' '}' も正しく扱えるので、括弧を数える必要はない)
+    next_match = _LINE_RE.search(log_bytes, json_start)
+    chunk_end = next_match.start() if next_match else len(log_bytes)
+    chunk = log_bytes[json_start:chunk_end].decode("utf-8")
+    prompt_data, chunk_json_end = _JSON_DECODER.raw_decode(chunk)
+    return prompt_data, json_start + len(chunk[:chunk_json_end].encode("utf-8"))
+
 # Streamlitのキャッシュ機能で、ファイル読み込みと解析を高速化します
-@st.cache_data(show_spinner="ログファイルを解析中...")
+# cache_resource は再実行ごとにDataFrameをコピーしないため、呼び出し側では
+# 返り値を直接書き換えないこと (フィルタ後は .copy() してから扱う)
+@st.cache_resource(show_spinner="ログファイルを解析中...")
 def load_log_data(log_file):
     """
     指定されたログファイルを解析し、ハンドごとの行動データをDataFrameとして返します。
@@ -17,136 +107,185 @@ def load_log_data(log_file):
         # main関数側でst.errorを表示するため、ここでは空のDFを返す
         return pd.DataFrame()
 
-    data = []
+    # 前回の解析結果がディスクに残っていれば、ログを解析し直さずにそれを使う
+    cache_path = _parquet_cache_path(log_file)
+    if os.path.exists(cache_path):
+        try:
+            return _read_parquet_cache(cache_path)
+        except Exception:
+            # キャッシュが壊れている場合は、ログから解析し直す
+            pass
+
+    # 列ごとのリストに直接値を積み、最後にまとめてDataFrame化する
+    hand_ids = []
+    agent_names = []
+    phases = []
+    chips_before = []
+    your_cards_lists = []
+    community_cards_lists = []
+    actions = []
+    amounts = []
+    reasonings = []
+    input_prompts = []
     current_hand = 0
     agent_prompts = {}
-    lines = []
-    line_count = 0
-    i = 0 
     
     try:
-        with open(log_file, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        line_count = len(lines)
-
-        while i < line_count:
-            line = lines[i]
+        if os.path.getsize(log_file) == 0:
+            # 空のファイルは mmap できない
+            log_bytes = b""
+        else:
+            # ファイル全体を str にデコードせず、OSのページキャッシュをそのままバイト列として走査する
+            # (mmap はマッチオブジェクトからも参照されるため明示的には閉じず、関数を抜けた時点で解放させる)
+            with open(log_file, 'rb') as f:
+                log_bytes = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # 行ごとのPythonループは回さず、正規表現で次の該当箇所まで一気に読み飛ばす
+        pos = 0
+        while True:
+            match = _LINE_RE.search(log_bytes, pos)
+            if match is None:
+                break
+            pos = match.end()
+            kind = match.lastgroup
 
             # 1. 新しいハンド（ゲーム）の開始を検出
-            hand_match = re.search(r"=== STARTING NEW HAND #(\d+) ===", line)
-            if hand_match:
-                current_hand = int(hand_match.group(1))
+            if kind == "hand":
+                current_hand = int(match.group("hand_id"))
                 agent_prompts = {} # ハンドが変わったらプロンプト情報をリセット
-                i += 1
-                continue
-
-            # 2. 'LLM Prompt for AgentX: {' という行を探す
-            prompt_match = re.search(r"LLM Prompt for (Agent\d+): \{", line)
-            if prompt_match:
-                agent_name = prompt_match.group(1)
-                json_str = "{\n" # '{' はもう見つけた
-                json_start_line = i + 1
-                i += 1 # 次の行から読み込み開始
-                bracket_level = 1
-                
-                # JSONブロック（'{'から'}'まで）を読み込む
-                while i < line_count:
-                    json_line = lines[i]
-                    
-                    brace_close_count = json_line.count("}")
-                    if brace_close_count > 0:
-                        bracket_level -= brace_close_count
-                        
-                        if bracket_level == 0:
-                            # この行でJSONが終わる
-                            last_brace_index = json_line.rfind('}')
-                            json_str += json_line[:last_brace_index + 1]
-                            break # JSON読み取りを終了
-                        elif bracket_level < 0:
-                            # 括弧の対応が取れない (ログが壊れている可能性)
-                            json_str += json_line
-                            break
-                        else:
-                            json_str += json_line
-                            
-                    elif "{" in json_line:
-                        bracket_level += json_line.count("{")
-                        json_str += json_line
-                    else:
-                        json_str += json_line
-                        
-                    i += 1
-                
-                if bracket_level != 0:
-                    # JSONが途中で切れている
-                    i += 1
-                    continue
-                    
+
+            # 2. 'LLM Prompt for AgentX: {' に続くJSONブロックを読み込む
+            elif kind == "prompt":
+                agent_name = match.group("prompt_agent").decode("ascii")
+                # パースをDecision検出時まで遅らせることもできるが、その場合は終端位置が分からず
+                # JSONブロックの中身まで正規表現で走査することになり、かえって遅くなる
+                # (ほぼすべてのプロンプトにDecisionが続くため、パースを省ける件数もわずか)
                 try:
-                    prompt_data = json.loads(json_str)
-                    agent_prompts[agent_name] = (prompt_data, json_str)
-                except json.JSONDecodeError:
-                    # パース失敗時は、古い情報が残らないようにキーを削除する
+                    prompt_data, json_end = _decode_prompt_json(log_bytes, pos - 1) # pos - 1 は '{' の位置
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    # パース失敗時 (JSONが途中で切れている等) は、古い情報が残らないように
+                    # キーを削除し、プロンプト行の直後から走査を続ける
                     agent_prompts.pop(agent_name, None)
-                    pass
-                
-                i += 1
-                continue
+                    continue
+                agent_prompts[agent_name] = prompt_data
+                # JSONブロックの中身は走査対象にしない
+                pos = json_end
 
             # 3. エージェントの出力情報（Decision）を検出
-            decision_match = re.search(r"\[(Agent\d+)\] Successfully parsed decision: (\w+), (\d+), (.*)", line)
-            if decision_match:
-                agent_name = decision_match.group(1)
-                action = decision_match.group(2)
-                amount = int(decision_match.group(3))
-                reasoning = decision_match.group(4).strip()
+            else:
+                # DataFrameに入れるグループだけをデコードする (int() はバイト列をそのまま受け付ける)
+                agent_name = match.group("decision_agent").decode("ascii")
+                action = match.group("action").decode("ascii")
+                amount = int(match.group("amount"))
+                reasoning = match.group("reasoning").decode("utf-8").strip()
 
                 if agent_name in agent_prompts:
-                    prompt_data, prompt_str = agent_prompts[agent_name]
-                    
+                    prompt_data = agent_prompts[agent_name]
+                
                     # コミュニティカードの枚数からフェーズを判定
                     community_cards_list = prompt_data.get("community", [])
                     num_community_cards = len(community_cards_list)
-                    
-                    if num_community_cards == 0:
-                        derived_phase = "preflop"
-                    elif num_community_cards == 3:
-                        derived_phase = "flop"
-                    elif num_community_cards == 4:
-                        derived_phase = "turn"
-                    elif num_community_cards == 5:
-                        derived_phase = "river"
-                    else:
-                        derived_phase = "unknown"
-                    
-                    data.append({
-                        "hand_id": current_hand,
-                        "agent_name": agent_name,
-                        "phase": derived_phase,
-                        "your_chips_before": prompt_data.get("your_chips", 0),
-                        "your_cards": ", ".join(prompt_data.get("your_cards", [])),
-                        "community_cards": ", ".join(community_cards_list),
-                        "action": action,
-                        "amount": amount,
-                        "reasoning": reasoning,
-                        "input_prompt_json": prompt_data,
-                    })
+                    derived_phase = _PHASE_BY_NCC[num_community_cards] if num_community_cards < 6 else "unknown"
+                
+                    hand_ids.append(current_hand)
+                    agent_names.append(agent_name)
+                    phases.append(derived_phase)
+                    chips_before.append(prompt_data.get("your_chips", 0))
+                    your_cards_lists.append(prompt_data.get("your_cards", []))
+                    community_cards_lists.append(community_cards_list)
+                    actions.append(action)
+                    amounts.append(amount)
+                    reasonings.append(reasoning)
+                    input_prompts.append(prompt_data)
 
                 else:
                     # 対応するプロンプトが見つからない (ログ前半など)
                     pass
-                
-                i += 1
-                continue
-                
-            i += 1 # マッチしない行は次の行へ
 
     except Exception as e:
         # 解析中に予期せぬエラーが発生した場合
         st.error(f"ログ解析中に予期せぬエラーが発生しました: {e}")
         return pd.DataFrame()
 
-    return pd.DataFrame(data)
+    df = pd.DataFrame({
+        "hand_id": hand_ids,
+        "agent_name": agent_names,
+        "phase": phases,
+        "your_chips_before": chips_before,
+        # カードのリストは行ごとに join せず、DataFrame化の際に列単位でまとめて文字列にする
+        "your_cards": pd.Series(your_cards_lists, dtype=object).str.join(", "),
+        "community_cards": pd.Series(community_cards_lists, dtype=object).str.join(", "),
+        "action": actions,
+        "amount": amounts,
+        "reasoning": reasonings,
+        "input_prompt_json": input_prompts,
+    })
+
+    # 値の種類が少ない列は category 型にして、フィルタや集計を整数コードの比較で済ませる
+    df["agent_name"] = df["agent_name"].astype("category")
+    df["action"] = df["action"].astype("category")
+    # phase はポーカーの進行順に並べたうえで、ログに出現したフェーズだけをカテゴリとして残す
+    df["phase"] = pd.Categorical(df["phase"], categories=_PHASE_ORDER, ordered=True).remove_unused_categories()
+    # 文字列の列は、1セルごとのPythonオブジェクトを持たないArrowの文字列型にする
+    for column in ("reasoning", "your_cards", "community_cards"):
+        df[column] = df[column].astype("string[pyarrow]")
+
+    if not df.empty:
+        _write_parquet_cache(df, cache_path)
+
+    return df
+
+@st.cache_data(show_spinner=False, hash_funcs={pd.DataFrame: id})
+def _hand_ids(df):
+    """
+    ログに含まれるハンドIDを昇順で返します。
+    """
+    return sorted(df['hand_id'].unique())
+
+def _filter_actions(df, players, phases, hands):
+    """
+    サイドバーで選択されたプレイヤー・フェーズ・ハンドIDで行動データを絞り込みます。
+    hands が空の場合は全ハンドを対象にします。
+    """
+    # 単純な isin の組み合わせなので、df.query の式パースを介さずブールマスクで絞り込む
+    mask = df['agent_name'].isin(players) & df['phase'].isin(phases)
+    
+    if hands:
+        mask &= df['hand_id'].isin(hands)
+        
+    return df[mask]
+
+# 以下の集計はフィルタ条件が同じなら結果も同じなので、再実行のたびに計算し直さないようキャッシュする。
+# df は load_log_data がキャッシュしている同一オブジェクトなので、中身ではなく id でハッシュする。
+@st.cache_data(show_spinner=False, hash_funcs={pd.DataFrame: id})
+def _action_count_tables(df, players, phases, hands):
+    """
+    フィルタ適用後のアクション集計 (全体 / プレイヤー別 / フェーズ別) を返します。
+    """
+    filtered_df = _filter_actions(df, players, phases, hands)
+
+    # category型の value_counts は出現しないカテゴリも0件として返すため除外する
+    action_counts = filtered_df['action'].value_counts()
+    action_counts = action_counts[action_counts > 0].reset_index()
+    action_counts.columns = ['action', 'count']
+
+    player_action_counts = filtered_df.groupby('agent_name', observed=True)['action'].value_counts()
+    player_action_counts = player_action_counts[player_action_counts > 0].rename('count').reset_index()
+
+    # phase列はポーカーの進行順に並んだ category 型なので、集計結果もその順序になる
+    phase_action_counts = filtered_df.groupby(['phase', 'action'], observed=True).size().reset_index(name='count')
+
+    return action_counts, player_action_counts, phase_action_counts
+
+@st.cache_data(show_spinner=False, hash_funcs={pd.DataFrame: id})
+def _chips_over_time(df, players):
+    """
+    選択されたプレイヤーについて、各ハンド開始時点のチップ量を返します。
+    """
+    chips_df = df[df['agent_name'].isin(players)]
+    
+    # 各ハンドIDの最初のレコード（そのハンドの開始時チップ）を取得
+    return chips_df.groupby(['agent_name', 'hand_id'], observed=True)['your_chips_before'].first().reset_index()
 
 # Streamlitのメインアプリケーション部分
 def main():
@@ -224,14 +363,12 @@ def main():
     # --- サイドバー (フィルタ) ---
     st.sidebar.header("🔍 表示フィルタ")
     
-    all_players = sorted(df['agent_name'].unique())
-    all_hands = sorted(df['hand_id'].unique())
+    # category型の列はカテゴリ一覧を保持しているので、列を走査せずに選択肢を作れる
+    all_players = df['agent_name'].cat.categories.tolist()
+    all_hands = _hand_ids(df)
     
-    # データを元にフェーズリストを動的生成
-    poker_phase_order = {"preflop": 0, "flop": 1, "turn": 2, "river": 3}
-    unique_phases = df['phase'].unique()
-    # 存在するフェーズをポーカーの順序でソート (unknown等は最後尾=99)
-    all_phases = sorted(unique_phases, key=lambda p: poker_phase_order.get(p, 99))
+    # phase のカテゴリはログに出現したフェーズのみで、ポーカーの順序 (unknownは最後尾) に並んでいる
+    all_phases = df['phase'].cat.categories.tolist()
 
     selected_players = st.sidebar.multiselect(
         "プレイヤーを選択:",
@@ -252,16 +389,10 @@ def main():
     )
 
     # --- フィルタを適用したDataFrameを作成 ---
-    query_parts = []
-    
-    query_parts.append("`agent_name` in @selected_players")
-    query_parts.append("`phase` in @selected_phases")
-    
-    if selected_hands:
-        query_parts.append("`hand_id` in @selected_hands")
-        
-    query_str = " & ".join(query_parts)
-    filtered_df = df.query(query_str).copy()
+    filtered_df = _filter_actions(df, selected_players, selected_phases, selected_hands).copy()
+    action_counts, player_action_counts, phase_action_counts = _action_count_tables(
+        df, selected_players, selected_phases, selected_hands
+    )
     
     
     if filtered_df.empty:
@@ -287,8 +418,6 @@ def main():
         
         with col1:
             st.subheader("アクション頻度 (円グラフ)")
-            action_counts = filtered_df['action'].value_counts().reset_index()
-            action_counts.columns = ['action', 'count']
             fig_action_pie = px.pie(action_counts, 
                                     names='action', 
                                     values='count',
@@ -299,7 +428,6 @@ def main():
 
         with col2:
             st.subheader("アクション頻度 (プレイヤー別)")
-            player_action_counts = filtered_df.groupby('agent_name')['action'].value_counts().rename('count').reset_index()
             fig_action_bar = px.bar(player_action_counts, 
                                      x='agent_name', 
                                      y='count',
@@ -324,7 +452,9 @@ def main():
         st.subheader("思考理由 (Reasoning) のサンプル")
         sample_size = min(10, len(filtered_df))
         if sample_size > 0:
-            st.dataframe(filtered_df[['hand_id', 'agent_name', 'phase', 'action', 'reasoning']].sample(sample_size))
+            # 先にサンプルする行を決めてから列を切り出し、全行分の射影を作らない
+            sample_index = np.random.default_rng().choice(filtered_df.index.to_numpy(), size=sample_size, replace=False)
+            st.dataframe(filtered_df.loc[sample_index, ['hand_id', 'agent_name', 'phase', 'action', 'reasoning']])
         else:
             st.info("サンプリングするデータがありません。")
 
@@ -375,10 +505,7 @@ def main():
         
         with col_add1:
             st.subheader("フェーズごとのアクション比率")
-            phase_action_counts = filtered_df.groupby(['phase', 'action']).size().reset_index(name='count')
             if not phase_action_counts.empty:
-                # フェーズの順序を適用
-                phase_action_counts['phase'] = pd.Categorical(phase_action_counts['phase'], categories=all_phases, ordered=True)
                 fig_phase_action = px.bar(
                     phase_action_counts,
                     x='phase',
@@ -387,7 +514,7 @@ def main():
                     title="フェーズごとのアクション内訳",
                     labels={'phase': 'フェーズ', 'count': '回数', 'action': 'アクション'},
                 )
-                # X軸のソートを無効にし、カテゴリカルの順序（poker_phase_order）を優先
+                # X軸のソートを無効にし、phase列のカテゴリの順序（ポーカーの進行順）を優先
                 fig_phase_action.update_xaxes(categoryorder=None) 
                 st.plotly_chart(fig_phase_action, use_container_width=True)
             else:
@@ -397,10 +524,7 @@ def main():
             st.subheader("チップ量の推移 (ハンド開始時点)")
             # フィルタされたプレイヤー（selected_players）の
             # チップ推移（全ハンド分）を表示する
-            chips_df = df[df['agent_name'].isin(selected_players)]
-            
-            # 各ハンドIDの最初のレコード（そのハンドの開始時チップ）を取得
-            chips_over_time = chips_df.groupby(['agent_name', 'hand_id'])['your_chips_before'].first().reset_index()
+            chips_over_time = _chips_over_time(df, selected_players)
             
             if not chips_over_time.empty:
                 fig_chips = px.line(